@@ -2,17 +2,94 @@ import os
 import re
 import tempfile
 import shutil
+import zipfile
 from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate, repeat
+from bisect import bisect_right
 import pandas as pd
 import streamlit as st
-import pdfplumber
-from fpdf import FPDF
+import fitz  # PyMuPDF
+from fpdf import FPDF  # fpdf2
+from fpdf.enums import XPos, YPos
+from fpdf.fonts import FontFace
 from datetime import datetime
 from PIL import Image
 
 # =================== CONFIGURAÇÃO ===================
 st.set_page_config(page_title="CREA-RJ", layout="wide", page_icon="")
 
+# PDFs maiores que este limite são gravados em disco em vez de processados em memória
+LIMITE_PDF_MEMORIA = 50 * 1024 * 1024  # 50 MB
+
+# Abaixo deste número de arquivos o custo de iniciar processos (spawn no Windows/macOS)
+# supera o ganho: os PDFs são processados no próprio processo do Streamlit
+MIN_ARQUIVOS_PARALELO = 8
+
+# =================== PADRÕES (compilados uma única vez) ===================
+_EMPTY_RE = re.compile(r'^(SEM|NAO|NÃO|NAO INFORMADO|SEM INFORMAÇÃO)\s*[A-Z]*\s*$', re.IGNORECASE)
+_AGENTE_RE = re.compile(r'(\d+\s*-\s*)([A-Za-zÀ-ÿ\s]+)')
+_AGENTE_NOME_RE = re.compile(r'\d+\s*-\s*([A-Za-zÀ-ÿ\s]+)')
+_DATA_RE = re.compile(r'(\d{2}/\d{2}/\d{4})')
+_RFP_RE = re.compile(r'RF Principal\s*:\s*(\d+)', re.IGNORECASE)
+_COPIA_ART_RE = re.compile(r'c[óo]pia\s+art', re.IGNORECASE)
+_LATITUDE_RE = re.compile(r'Latitude\s*:\s*([-\d,.]+)')
+_LONGITUDE_RE = re.compile(r'Longitude\s*:\s*([-\d,.]+)')
+_COORDENADAS_RE = re.compile(r'Latitude\s*:\s*[-\d,.]+\s*Longitude\s*:\s*[-\d,.]+', re.IGNORECASE)
+_DATA_ANTERIOR_RE = re.compile(r'Data\s+do\s+Relatório\s+Anterior\s*:\s*([^\n]+)')
+_INFO_COMPLEMENTARES_RE = re.compile(r'Informações\s+Complementares\s*:\s*(.*)', re.DOTALL)
+
+# Variações da palavra "Ofício" numa única alternação ("oficio" já é coberto por "of[ií]cio")
+_OFICIO_RE = re.compile(r'of[ií]cio|of\.|ofc|of[\s\-]?[0-9]', re.IGNORECASE)
+
+# Metadados básicos do cabeçalho del RF
+_CAMPOS_META = [
+    ('RF', re.compile(r'Número\s*:\s*([^\n]+)')),  # Alterado de 'Número' para 'RF'
+    ('Situação', re.compile(r'Situação\s*:\s*([^\n]+)')),
+    ('Fiscal', re.compile(r'Agente\s+de\s+Fiscalização\s*:\s*([^\n]+)')),  # Alterado de 'Agente de Fiscalização' para 'Fiscal'
+    ('Supervisão', re.compile(r'Responsável\s*:\s*([^\n]+)')),  # Alterado de 'Responsável' para 'Supervisão'
+    ('Data', re.compile(r'Data\s+Relatório\s*:\s*([^\n]+)')),  # Alterado de 'Data Relatório' para 'Data'
+    ('Fato Gerador', re.compile(r'Fato\s+Gerador\s*:\s*([^\n]+)')),
+    ('Protocolo', re.compile(r'Protocolo\s*:\s*([^\n]+)')),
+    ('Tipo Visita', re.compile(r'Tipo\s+Visita\s*:\s*([^\n]+)'))
+]
+
+# Títulos das seções del RF e o padrão de cada uma
+_SECTION_TITLES = [
+    "01 - Endereço Empreendimento",
+    "02 - Identificação del Contratante del Empreendimento",
+    "03 - Atividade Desenvolvida",
+    "04 - Identificação dos Contratados, Responsáveis Técnicos e/ou Fiscalizados",
+    "05 - Documentos Solicitados / Expedidos",
+    "06 - Documentos Recebidos",
+    "07 - Outras Informações",
+    "08 - Fotos"
+]
+# Início de qualquer seção conhecida (opcionalmente precedido de "*") ou um marcador "*NN -"
+_SECTION_SPLIT_RE = re.compile(
+    r'\*?(?P<titulo>{})|\*\d+\s*-\s*'.format('|'.join(re.escape(t) for t in _SECTION_TITLES)),
+    re.IGNORECASE
+)
+_SECTION_TITLES_LOWER = {t.lower(): t for t in _SECTION_TITLES}
+
+# Ordem das colunas da planilha ('RF Principal' ao lado de 'Data')
+COLUNAS_ORDENADAS = [
+    'RF', 'Situação', 'Fiscal', 'Supervisão', 'Data', 'RF Principal',
+    'Fato Gerador', 'Protocolo', 'Tipo Visita',
+    'Endereço Empreendimento - Latitude', 'Endereço Empreendimento - Longitude',
+    'Endereço Empreendimento - Endereço', 'Endereço Empreendimento - Descritivo',
+    'Identificação do Contratante',
+    'Atividade Desenvolvida',
+    'Identificação dos Contratados/Responsáveis', 'Autuação',
+    'Documentos Solicitados/Expedidos', 'Ofício',
+    'Documentos Recebidos', 'Resposta Ofício',
+    'Outras Informações - Data Relatório Anterior', 'Outras Informações - Informações Complementares',
+    'Fotos',
+    'Ações',
+    'Fiscal Nome Completo', 'Supervisão Sigla',
+    'Nome Arquivo', 'Fotos Extraídas'
+]
+
 # =================== FUNÇÕES AUXILIARES ===================
 def criar_temp_dir():
     """Cria diretório temporário"""
@@ -22,26 +99,55 @@ def limpar_temp_dir(temp_dir):
     """Remove diretório temporário"""
     shutil.rmtree(temp_dir, ignore_errors=True)
 
+def compactar_fotos(temp_dir):
+    """Compacta em ZIP (na memória) as fotos salvas em temp_dir/fotos; retorna None se não houver fotos"""
+    fotos_dir = os.path.join(temp_dir, "fotos")
+    if not os.path.isdir(fotos_dir):
+        return None
+    
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        for raiz, _, arquivos in os.walk(fotos_dir):
+            for arquivo in arquivos:
+                caminho = os.path.join(raiz, arquivo)
+                zf.write(caminho, os.path.relpath(caminho, fotos_dir))
+    return buffer.getvalue()
+
 def is_empty_info(text):
     """Verifica se o texto indica informação ausente"""
-    if not text or str(text).strip() == '':
+    if not text:
+        return True
+    text = str(text).strip()
+    if not text:
         return True
-    return bool(re.search(r'^(SEM|NAO|NÃO|NAO INFORMADO|SEM INFORMAÇÃO)\s*[A-Z]*\s*$', str(text).strip(), re.IGNORECASE))
+    # Só recorre à regex quando o texto começa como SEM/NAO/NÃO
+    if text[:3].upper() not in ('SEM', 'NAO', 'NÃO'):
+        return False
+    return bool(_EMPTY_RE.match(text))
 
 def clean_text(text):
     """Limpa texto removendo espaços extras e normalizando"""
     if not text:
         return ''
-    text = str(text).replace('\n', ' ').strip()
+    text = text if isinstance(text, str) else str(text)
+    # Caminho rápido: o único espaço em branco presente é ' ' simples (isprintable()
+    # é falso para \n, \t, \r, NBSP etc.), então basta remover as bordas
+    if '  ' not in text and text.isprintable():
+        return text.strip()
     return ' '.join(text.split())
 
+def truncar(texto, limite):
+    """Corta o texto em `limite` caracteres, acrescentando '...' quando necessário"""
+    texto = str(texto)
+    return texto[:limite] + '...' if len(texto) > limite else texto
+
 def formatar_agente_fiscalizacao(texto):
     """Formata o agente de fiscalização para manter apenas número e primeiro nome"""
     if not texto:
         return ''
     
     # Extrai o número e nome (padrão: "1010 - CELINA")
-    match = re.match(r'(\d+\s*-\s*)([A-Za-zÀ-ÿ\s]+)', texto)
+    match = _AGENTE_RE.match(texto)
     if match:
         numero = match.group(1).strip()
         nome_completo = match.group(2).strip()
@@ -55,7 +161,7 @@ def get_nome_completo_agente(texto):
         return ''
     
     # Extrai o nome completo (padrão: "1010 - CELINA")
-    match = re.match(r'\d+\s*-\s*([A-Za-zÀ-ÿ\s]+)', texto)
+    match = _AGENTE_NOME_RE.match(texto)
     if match:
         return match.group(1).strip()
     return texto
@@ -77,32 +183,53 @@ def formatar_data_relatorio(texto):
         return ''
     
     # Remove qualquer texto após la data (padrão: "22/05/2025    Fato Gerador:")
-    match = re.search(r'(\d{2}/\d{2}/\d{4})', texto)
+    match = _DATA_RE.search(texto)
     if match:
         return match.group(1)
     return texto
 
+def numero_apos_chave(texto, chaves, aceita_barra=False, exige_espaco=False):
+    """Retorna os dígitos que seguem a primeira ocorrência de uma das chaves (sem usar regex)
+    
+    Entre a chave e o número são aceitos espaços (e '/' se `aceita_barra`);
+    com `exige_espaco` é necessário ao menos um espaço. Busca sem distinção de maiúsculas.
+    """
+    texto = texto.upper()
+    tamanho = len(texto)
+    melhor_pos, melhor_numero = tamanho, ''
+    
+    for chave in chaves:
+        i = texto.find(chave)
+        while 0 <= i < melhor_pos:
+            j = i + len(chave)
+            while j < tamanho and (texto[j].isspace() or (aceita_barra and texto[j] == '/')):
+                j += 1
+            inicio = j
+            while j < tamanho and texto[j].isdecimal():
+                j += 1
+            
+            if j > inicio and (not exige_espaco or inicio > i + len(chave)):
+                melhor_pos, melhor_numero = i, texto[inicio:j]
+                break
+            i = texto.find(chave, i + 1)
+    
+    return melhor_numero
+
 def extrair_numero_protocolo(texto):
     """Extrai apenas o número do protocolo del campo Fato Gerador"""
     if not texto:
         return ''
     
-    # Padrão: "" ou similar
-    match = re.search(r'(?:PROCESSO|PROTOCOLO)[/\s]*(\d+)', texto, re.IGNORECASE)
-    if match:
-        return match.group(1)
-    return ''
+    # Padrão: "PROCESSO 123" / "PROTOCOLO/123" ou similar
+    return numero_apos_chave(texto, ('PROCESSO', 'PROTOCOLO'), aceita_barra=True)
 
 def extrair_numero_autuacao(texto):
     """Extrai o número de autuação do texto da seção 04"""
     if not texto:
         return ''
     
-    # Padrão: "" (case insensitive)
-    match = re.search(r'AUTUA[ÇC]AO\s+(\d+)', texto, re.IGNORECASE)
-    if match:
-        return match.group(1)
-    return ''
+    # Padrão: "AUTUAÇAO 123" (case insensitive)
+    return numero_apos_chave(texto, ('AUTUAÇAO', 'AUTUACAO'), exige_espaco=True)
 
 def extrair_rf_principal(texto):
     """Extrai o RF Principal do texto"""
@@ -110,22 +237,36 @@ def extrair_rf_principal(texto):
         return ''
     
     # Padrão: "" (com ou sem espaços, case insensitive)
-    match = re.search(r'RF Principal\s*:\s*(\d+)', texto, re.IGNORECASE)
+    match = _RFP_RE.search(texto)
     if match:
         return match.group(1)
     return ''
 
-def extrair_secao(texto, titulo_secao):
-    """Extrai o conteúdo de uma seção específica del PDF"""
-    padrao = re.compile(
-        r'{}\s*(.*?)(?=\s*\*\d+\s*-\s*|\Z)'.format(re.escape(titulo_secao)), 
-        re.DOTALL | re.IGNORECASE
-    )
-    match = padrao.search(texto)
-    if match:
-        conteudo = match.group(1).strip()
-        return None if is_empty_info(conteudo) else conteudo
-    return None
+def dividir_secoes(texto):
+    """Divide o texto del PDF em seções numa única passada
+    
+    Retorna um dicionário com todos os títulos de _SECTION_TITLES; o valor é None
+    quando a seção não existe ou indica informação ausente.
+    """
+    secoes = dict.fromkeys(_SECTION_TITLES)
+    encontradas = set()
+    marcadores = list(_SECTION_SPLIT_RE.finditer(texto))
+    
+    for i, match in enumerate(marcadores):
+        if match.group('titulo') is None:
+            continue
+        titulo = _SECTION_TITLES_LOWER[match.group('titulo').lower()]
+        if titulo in encontradas:
+            continue  # Mantém apenas a primeira ocorrência
+        encontradas.add(titulo)
+        
+        # A seção vai até o próximo título/marcador ou até o fim do texto
+        fim = marcadores[i + 1].start() if i + 1 < len(marcadores) else len(texto)
+        conteudo = texto[match.end():fim].strip()
+        if not is_empty_info(conteudo):
+            secoes[titulo] = conteudo
+    
+    return secoes
 
 def verificar_oficio(texto):
     """Verifica se contém registros de ofício no texto (retorna 1 se sim, 0 se não)"""
@@ -133,105 +274,99 @@ def verificar_oficio(texto):
         return 0
     
     # Verifica se contém a palavra "Ofício" (com ou sem acento) e variações
-    padroes = [
-        r'of[ií]cio',
-        r'of\.',
-        r'ofc',
-        r'oficio',
-        r'of[\s\-]?[0-9]'
-    ]
-    
-    texto_str = str(texto).lower()
-    for padrao in padroes:
-        if re.search(padrao, texto_str, re.IGNORECASE):
-            return 1
-    return 0
+    return int(bool(_OFICIO_RE.search(str(texto))))
 
 def verificar_resposta_oficio(texto):
     """Verifica se contém 'Cópia ART' no texto (retorna 1 se sim, 0 se não)"""
     if not texto or is_empty_info(texto):
         return 0
     
-    # Verifica se contém "Cópia ART" (case insensitive)
-    texto_str = str(texto).lower()
-    if re.search(r'c[óo]pia\s+art', texto_str, re.IGNORECASE):
-        return 1
-    return 0
-
-def encontrar_pagina_secao_fotos(texto_completo, pdf):
-    """Encontra la página onde está a seção 08 - Fotos"""
-    for page_num, page in enumerate(pdf.pages, 1):
-        texto_pagina = page.extract_text() or ""
-        if "08 - Fotos" in texto_pagina:
-            return page_num
-    return None
-
-def extrair_fotos_secao(pdf_path, temp_dir, filename):
-    """Extrai apenas as fotos da seção 08 - Fotos, ignorando logotipos e assinaturas"""
-    fotos_extraidas = []
-    pdf_name = os.path.splitext(filename)[0]
-    fotos_dir = os.path.join(temp_dir, "fotos", pdf_name)
-    os.makedirs(fotos_dir, exist_ok=True)
+    # Verifica se contém "Cópia ART" (padrão já compilado com IGNORECASE)
+    return int(bool(_COPIA_ART_RE.search(str(texto))))
+
+def encontrar_pagina_secao_fotos(texto_completo, textos_paginas):
+    """Encontra la página onde está a seção 08 - Fotos a partir do texto já extraído"""
+    idx = texto_completo.find("08 - Fotos")
+    if idx < 0:
+        return None
+    
+    # Posição final de cada página no texto completo (páginas unidas por "\n")
+    fins_paginas = list(accumulate(len(t) + 1 for t in textos_paginas))
+    return bisect_right(fins_paginas, idx) + 1
+
+def extrair_fotos_secao(doc, texto_completo, textos_paginas, temp_dir, filename, erros, salvar=False, pasta_fotos=None):
+    """Conta (e, se `salvar`, grava em disco) as fotos da seção 08 - Fotos, ignorando logotipos e assinaturas
+    
+    Mensagens de erro são acrescentadas a `erros` (a função roda fora do contexto do Streamlit).
+    As fotos são gravadas em `temp_dir/fotos/<pasta_fotos>` (padrão: nome do arquivo sem extensão).
+    """
+    total_fotos = 0
+    fotos_dir = None
     
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            # Extrai texto completo para encontrar a seção de fotos
-            texto_completo = "\n".join(page.extract_text() or "" for page in pdf.pages)
-            
-            # Encontra la página onde está a seção de fotos
-            pagina_fotos = encontrar_pagina_secao_fotos(texto_completo, pdf)
+        # Encontra la página onde está a seção de fotos
+        pagina_fotos = encontrar_pagina_secao_fotos(texto_completo, textos_paginas)
+        
+        if pagina_fotos is None:
+            return total_fotos
             
-            if pagina_fotos is None:
-                return fotos_extraidas
+        # Processa apenas la página onde está a seção de fotos
+        pagina = doc[pagina_fotos - 1]
+        
+        # Filtra apenas imagens que estão provavelmente na seção de fotos
+        # (exclui logotipos e assinaturas que geralmente estão no topo ou rodapé)
+        altura_pagina = pagina.rect.height
+        
+        for img_idx, img in enumerate(doc.get_page_images(pagina_fotos - 1, full=True)):
+            try:
+                # Calcula a posição vertical da imagem (para excluir cabeçalho/rodapé)
+                bbox = pagina.get_image_bbox(img)
+                if bbox.is_empty or bbox.is_infinite:
+                    continue
+                y_pos = bbox.y0
                 
-            # Processa apenas la página onde está a seção de fotos
-            pagina = pdf.pages[pagina_fotos - 1]
-            
-            # Verifica se há imagens na página
-            if hasattr(pagina, 'images') and pagina.images:
-                # Filtra apenas imagens que estão provavelmente na seção de fotos
-                # (exclui logotipos e assinaturas que geralmente estão no topo ou rodapé)
-                altura_pagina = pagina.height
+                # Exclui imagens muito próximas del topo (logotipos) ou rodapé (assinaturas)
+                if y_pos < altura_pagina * 0.15 or y_pos > altura_pagina * 0.85:
+                    continue
+                
+                # Exclui imagens muito pequenas (ícones, selos) pelo tamanho desenhado na página
+                if bbox.width < 100 or bbox.height < 100:
+                    continue
+                
+                # Toda imagem que passa pelos filtros conta como foto, salvando ou não
+                total_fotos += 1
+                if not salvar:
+                    continue
+                
+                # Extrai a imagem já no formato original (sem recodificação)
+                imagem = doc.extract_image(img[0])
+                if not imagem or not imagem['image']:
+                    erros.append(f"Imagem {img_idx+1} sem conteúdo extraível; não foi salva")
+                    continue
+                
+                if fotos_dir is None:
+                    pdf_name = pasta_fotos or os.path.splitext(filename)[0]
+                    fotos_dir = os.path.join(temp_dir, "fotos", pdf_name)
+                    os.makedirs(fotos_dir, exist_ok=True)
                 
-                for img_idx, img in enumerate(pagina.images):
-                    try:
-                        # Calcula a posição vertical da imagem (para excluir cabeçalho/rodapé)
-                        y_pos = img['top']
-                        
-                        # Exclui imagens muito próximas del topo (logotipos) ou rodapé (assinaturas)
-                        if y_pos < altura_pagina * 0.15 or y_pos > altura_pagina * 0.85:
-                            continue
-                            
-                        # Exclui imagens muito pequenas (ícones, selos)
-                        if img['width'] < 100 or img['height'] < 100:
-                            continue
-                            
-                        # Extrai a imagem
-                        if 'stream' in img:
-                            img_data = img['stream'].get_data()
-                            if img_data:
-                                # Salva a imagem
-                                img_name = f"foto_{img_idx+1}.png"
-                                img_path = os.path.join(fotos_dir, img_name)
-                                
-                                with open(img_path, "wb") as f:
-                                    f.write(img_data)
-                                
-                                fotos_extraidas.append({
-                                    'nome': img_name,
-                                    'caminho': img_path,
-                                    'pagina': pagina_fotos
-                                })
-                    except Exception as e:
-                        st.error(f"Erro ao extrair imagem {img_idx+1}: {e}")
+                # Salva a imagem
+                img_name = f"foto_{img_idx+1}.{imagem['ext']}"
+                with open(os.path.join(fotos_dir, img_name), "wb") as f:
+                    f.write(imagem['image'])
+            except Exception as e:
+                erros.append(f"Erro ao extrair imagem {img_idx+1}: {e}")
     except Exception as e:
-        st.error(f"Erro ao abrir PDF para extração de imagens: {e}")
+        erros.append(f"Erro ao extrair imagens do PDF: {e}")
     
-    return fotos_extraidas
+    return total_fotos
 
 # =================== MÓDULO DE EXTRAÇÃO ===================
-def extrair_todos_dados(texto, filename, pdf_path, temp_dir):
-    """Extrai todos os dados del PDF de forma estruturada"""
+def extrair_todos_dados(doc, filename, temp_dir, salvar_fotos=False, pasta_fotos=None):
+    """Extrai todos os dados del PDF (documento já aberto) de forma estruturada"""
+    # Extrai texto del PDF uma única vez (por página, reaproveitado na busca das fotos)
+    textos_paginas = [page.get_text("text") for page in doc]
+    texto = "\n".join(textos_paginas)
+    
     dados = {
         'RF': '',  # Alterado de 'Número' para 'RF'
         'RF Principal': '',  # Nova coluna para RF Principal
@@ -283,23 +418,15 @@ def extrair_todos_dados(texto, filename, pdf_path, temp_dir):
         
         # Informações para link de fotos
         'Nome Arquivo': filename,
-        'Fotos Extraídas': 0
+        'Fotos Extraídas': 0,
+        
+        # Erros exibidos pelo processo principal (não entra na planilha)
+        'Erros': []
     }
     
     # Extrai metadados básicos
-    campos_meta = [
-        ('RF', r'Número\s*:\s*([^\n]+)'),  # Alterado de 'Número' para 'RF'
-        ('Situação', r'Situação\s*:\s*([^\n]+)'),
-        ('Fiscal', r'Agente\s+de\s+Fiscalização\s*:\s*([^\n]+)'),  # Alterado de 'Agente de Fiscalização' para 'Fiscal'
-        ('Supervisão', r'Responsável\s*:\s*([^\n]+)'),  # Alterado de 'Responsável' para 'Supervisão'
-        ('Data', r'Data\s+Relatório\s*:\s*([^\n]+)'),  # Alterado de 'Data Relatório' para 'Data'
-        ('Fato Gerador', r'Fato\s+Gerador\s*:\s*([^\n]+)'),
-        ('Protocolo', r'Protocolo\s*:\s*([^\n]+)'),
-        ('Tipo Visita', r'Tipo\s+Visita\s*:\s*([^\n]+)')
-    ]
-    
-    for campo, padrao in campos_meta:
-        match = re.search(padrao, texto)
+    for campo, padrao in _CAMPOS_META:
+        match = padrao.search(texto)
         if match:
             dados[campo] = clean_text(match.group(1))
     
@@ -315,20 +442,22 @@ def extrair_todos_dados(texto, filename, pdf_path, temp_dir):
     dados['Data'] = formatar_data_relatorio(dados['Data'])  # Alterado de 'Data Relatório' para 'Data'
     dados['Fiscal Nome Completo'] = get_nome_completo_agente(dados['Fiscal'])
     
+    # Separa as seções del relatório
+    secoes = dividir_secoes(texto)
+    
     # Seção 01 - Endereço Empreendimento
-    secao_endereco = extrair_secao(texto, "01 - Endereço Empreendimento")
+    secao_endereco = secoes["01 - Endereço Empreendimento"]
     if secao_endereco:
         # Extrai latitude e longitude
-        lat_match = re.search(r'Latitude\s*:\s*([-\d,.]+)', secao_endereco)
-        long_match = re.search(r'Longitude\s*:\s*([-\d,.]+)', secao_endereco)
+        lat_match = _LATITUDE_RE.search(secao_endereco)
+        long_match = _LONGITUDE_RE.search(secao_endereco)
         if lat_match:
             dados['Endereço Empreendimento - Latitude'] = clean_text(lat_match.group(1))
         if long_match:
             dados['Endereço Empreendimento - Longitude'] = clean_text(long_match.group(1))
         
         # Extrai endereço (linha após coordenadas)
-        coord_pattern = r'Latitude\s*:\s*[-\d,.]+\s*Longitude\s*:\s*[-\d,.]+'
-        endereco_part = re.sub(coord_pattern, '', secao_endereco, flags=re.IGNORECASE)
+        endereco_part = _COORDENADAS_RE.sub('', secao_endereco)
         endereco_lines = [line.strip() for line in endereco_part.split('\n') if line.strip()]
         if endereco_lines:
             dados['Endereço Empreendimento - Endereço'] = clean_text(endereco_lines[0])
@@ -341,28 +470,29 @@ def extrair_todos_dados(texto, filename, pdf_path, temp_dir):
                 dados['Endereço Empreendimento - Descritivo'] = desc_text
     
     # Seção 02 - Identificação do Contratante
-    secao_contratante = extrair_secao(texto, "02 - Identificação del Contratante del Empreendimento")
+    secao_contratante = secoes["02 - Identificação del Contratante del Empreendimento"]
     if secao_contratante:
         dados['Identificação do Contratante'] = clean_text(secao_contratante)
     
     # Seção 03 - Atividade Desenvolvida
-    secao_atividade = extrair_secao(texto, "03 - Atividade Desenvolvida")
+    secao_atividade = secoes["03 - Atividade Desenvolvida"]
     if secao_atividade:
         dados['Atividade Desenvolvida'] = clean_text(secao_atividade)
     
     # Seção 04 - Identificação dos Contratados/Responsáveis
-    secao_contratados = extrair_secao(texto, "04 - Identificação dos Contratados, Responsáveis Técnicos e/ou Fiscalizados")
+    secao_contratados = secoes["04 - Identificação dos Contratados, Responsáveis Técnicos e/ou Fiscalizados"]
     if secao_contratados:
         dados['Identificação dos Contratados/Responsáveis'] = clean_text(secao_contratados)
         # Extrai número de autuação se existir
         dados['Autuação'] = extrair_numero_autuacao(secao_contratados)
         
         # ALTERAÇÃO SOLICITADA: Calcula ações baseado em "Ramo Atividade" em vez de "Contratado" e "Responsável Técnico"
-        ramos_atividade = len(re.findall(r'Ramo\s+Atividade\s*:', secao_contratados, re.IGNORECASE))
-        dados['Ações'] = ramos_atividade
+        # (espaços normalizados e minúsculas: basta contar as duas grafias possíveis do rótulo)
+        normalizado = ' '.join(secao_contratados.lower().split())
+        dados['Ações'] = normalizado.count('ramo atividade:') + normalizado.count('ramo atividade :')
     
     # Seção 05 - Documentos Solicitados/Expedidos (MODIFICADA para pegar apenas conteúdo antes de "Fonte Informação")
-    secao_docs_solicitados = extrair_secao(texto, "05 - Documentos Solicitados / Expedidos")
+    secao_docs_solicitados = secoes["05 - Documentos Solicitados / Expedidos"]
     if secao_docs_solicitados:
         # Divide o texto na primeira ocorrência de "Fonte Informação" e pega apenas a parte antes
         conteudo = secao_docs_solicitados.split("Fonte Informação")[0].strip()
@@ -371,35 +501,35 @@ def extrair_todos_dados(texto, filename, pdf_path, temp_dir):
         dados['Ofício'] = verificar_oficio(conteudo)
     
     # Seção 06 - Documentos Recebidos
-    secao_docs_recebidos = extrair_secao(texto, "06 - Documentos Recebidos")
+    secao_docs_recebidos = secoes["06 - Documentos Recebidos"]
     if secao_docs_recebidos:
         dados['Documentos Recebidos'] = clean_text(secao_docs_recebidos)
         # Verifica se contém "Cópia ART" (retorna 1 se sim, 0 se não)
         dados['Resposta Ofício'] = verificar_resposta_oficio(secao_docs_recebidos)
     
     # Seção 07 - Outras Informações
-    secao_outras = extrair_secao(texto, "07 - Outras Informações")
+    secao_outras = secoes["07 - Outras Informações"]
     if secao_outras:
         # Extrai data do relatório anterior
-        data_anterior = re.search(r'Data\s+do\s+Relatório\s+Anterior\s*:\s*([^\n]+)', secao_outras)
+        data_anterior = _DATA_ANTERIOR_RE.search(secao_outras)
         if data_anterior:
             dados['Outras Informações - Data Relatório Anterior'] = clean_text(data_anterior.group(1))
         
         # Extrai informações complementares
-        info_complementares = re.search(r'Informações\s+Complementares\s*:\s*(.*)', secao_outras, re.DOTALL)
+        info_complementares = _INFO_COMPLEMENTARES_RE.search(secao_outras)
         if info_complementares:
             dados['Outras Informações - Informações Complementares'] = clean_text(info_complementares.group(1))
     
     # Seção 08 - Fotos (extrai as fotos do PDF)
-    secao_fotos = extrair_secao(texto, "08 - Fotos")
+    secao_fotos = secoes["08 - Fotos"]
     if secao_fotos:
         # Extrai as fotos apenas da seção 08 - Fotos
-        fotos_extraidas = extrair_fotos_secao(pdf_path, temp_dir, filename)
-        dados['Fotos Extraídas'] = len(fotos_extraidas)
+        fotos_extraidas = extrair_fotos_secao(doc, texto, textos_paginas, temp_dir, filename, dados['Erros'], salvar=salvar_fotos, pasta_fotos=pasta_fotos)
+        dados['Fotos Extraídas'] = fotos_extraidas
         
         if fotos_extraidas:
             # Cria um link para as fotos no Excel
-            dados['Fotos'] = f"{len(fotos_extraidas)} foto(s) extraída(s) da seção 08 - Fotos"
+            dados['Fotos'] = f"{fotos_extraidas} foto(s) extraída(s) da seção 08 - Fotos"
         else:
             dados['Fotos'] = "Seção de fotos encontrada, mas nenhuma imagem extraída"
     else:
@@ -407,6 +537,23 @@ def extrair_todos_dados(texto, filename, pdf_path, temp_dir):
     
     return dados
 
+def processar_arquivo(origem, filename, temp_dir, salvar_fotos=False, pasta_fotos=None):
+    """Processa um único PDF (executado em processo separado) e retorna seus dados
+    
+    `origem` é o conteúdo do PDF em bytes ou, para arquivos grandes, o caminho em disco;
+    com `salvar_fotos` as fotos da seção 08 são gravadas em `temp_dir/fotos/<pasta_fotos>`.
+    """
+    if isinstance(origem, bytes):
+        # Abre o PDF uma única vez direto da memória: texto e fotos saem do mesmo documento
+        with fitz.open(stream=origem, filetype="pdf") as doc:
+            return extrair_todos_dados(doc, filename, temp_dir, salvar_fotos, pasta_fotos)
+    
+    try:
+        with fitz.open(origem) as doc:
+            return extrair_todos_dados(doc, filename, temp_dir, salvar_fotos, pasta_fotos)
+    finally:
+        os.unlink(origem)
+
 # =================== GERADORES DE RELATÓRIO ===================
 def gerar_relatorio_completo(df):
     """Gera PDF com todos os dados extraídos com novo cabeçalho"""
@@ -424,120 +571,108 @@ def gerar_relatorio_completo(df):
         pass
     
     # Título do relatório
-    pdf.set_font('Arial', 'B', 16)
-    pdf.cell(0, 10, 'Relatório Completo de Fiscalização', 0, 1, 'C')
+    pdf.set_font('Helvetica', 'B', 16)
+    pdf.cell(0, 10, 'Relatório Completo de Fiscalização', new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
     
     # Informações del agente e supervisão
-    pdf.set_font('Arial', '', 12)
+    pdf.set_font('Helvetica', '', 12)
     
     # Obtém o nome completo del primeiro agente (assumindo que todos são do mesmo agente)
     nome_completo_agente = df.iloc[0]['Fiscal Nome Completo'] if 'Fiscal Nome Completo' in df.columns and len(df) > 0 else ''
-    pdf.cell(0, 10, f'Agente de Fiscalização: {nome_completo_agente}', 0, 1)
+    pdf.cell(0, 10, f'Agente de Fiscalização: {nome_completo_agente}', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
     
     # Supervisão (fixo como SBXD)
-    pdf.cell(0, 10, 'Supervisão: SBXD', 0, 1)
+    pdf.cell(0, 10, 'Supervisão: SBXD', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
     
     # Período (primeira e última data)
     if len(df) > 0:
-        datas = pd.to_datetime(df['Data'], errors='coerce', dayfirst=True)
-        datas_validas = datas[~datas.isna()]
+        # As datas já vêm como dd/mm/aaaa (formatar_data_relatorio): com o formato explícito
+        # a conversão é vetorizada (sem inferência via dateutil) e datas impossíveis viram NaT
+        datas = df['Data'].astype(str)
+        datas = datas[datas.str.fullmatch(r'\d{2}/\d{2}/\d{4}')]
+        datas_validas = pd.to_datetime(datas, format='%d/%m/%Y', errors='coerce').dropna()
         if not datas_validas.empty:
             primeira_data = datas_validas.min().strftime('%d/%m/%Y')
             ultima_data = datas_validas.max().strftime('%d/%m/%Y')
-            pdf.cell(0, 10, f'Período: {primeira_data} a {ultima_data}', 0, 1)
+            pdf.cell(0, 10, f'Período: {primeira_data} a {ultima_data}', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
     
     # Data de geração do relatório
-    pdf.cell(0, 10, f'Gerado em: {datetime.now().strftime("%d/%m/%Y %H:%M:%S")}', 0, 1)
+    pdf.cell(0, 10, f'Gerado em: {datetime.now().strftime("%d/%m/%Y %H:%M:%S")}', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
     
     pdf.ln(10)
     
     # Configuração de colunas resumidas - ADICIONADAS COLUNAS RF PRINCIPAL, LEGALIZAÇÃO, FOTOS E RESPOSTA OFÍCIOS
     colunas = ['RFs', 'RF Principal', 'Legalização', 'Data', 'Ações', 'Ofícios', 'Resposta Ofícios', 'Protocolos', 'Autuações', 'Fotos']
-    col_widths = [20, 25, 18, 15, 10, 10, 24, 15, 15, 10]
-    
-    # Cabeçalho
-    pdf.set_font('Arial', 'B', 7)
-    for w, h in zip(col_widths, colunas):
-        pdf.cell(w, 8, h, 1, 0, 'C')
-    pdf.ln()
-    
-    # Dados resumidos
-    pdf.set_font('Arial', '', 7)
+    # Larguras (mm) suficientes para o texto em Helvetica 7 sem quebra de linha dentro da célula
+    col_widths = [26, 26, 18, 16, 10, 12, 24, 16, 16, 12]
     
     # Conta o número de registros válidos (excluindo a linha de TOTAL se existir)
     df_validos = df[df['RF'] != 'TOTAL'] if 'TOTAL' in df['RF'].values else df
     num_registros = len(df_validos)
     
-    # Variáveis para calcular totais
-    total_acoes = 0
-    total_oficios = 0
-    total_resposta_oficios = 0
-    total_protocolos = 0
-    total_autuacoes = 0
-    total_fotos = 0
+    # Indicadores por registro (vetorizado)
+    tem_legalizacao = df_validos['RF Principal'].astype(str).str.strip().ne('')  # 1 se tiver RF Principal
+    tem_protocolo = df_validos['Protocolo'].astype(str).str.strip().ne('')  # 1 se tiver protocolo
+    tem_autuacao = df_validos['Autuação'].astype(str).str.strip().ne('')  # 1 se tiver autuação
+    tem_fotos = df_validos['Fotos'].astype(str).str.contains('foto(s) extraída(s) da seção 08 - Fotos', regex=False)
+    
+    # Calcula os totais por coluna (vetorizado)
+    total_acoes = df_validos['Ações'].sum()
+    total_oficios = df_validos['Ofício'].sum()
+    total_resposta_oficios = df_validos['Resposta Ofício'].sum()
+    total_protocolos = tem_protocolo.sum()
+    total_autuacoes = tem_autuacao.sum()
+    total_fotos = tem_fotos.sum()
+    
+    # Monta todas as linhas da tabela de uma vez, coluna a coluna
+    linhas = zip(
+        df_validos['RF'].map(lambda v: truncar(v, 15)),
+        df_validos['RF Principal'].map(lambda v: truncar(v, 15)),
+        tem_legalizacao.map({True: '1', False: '0'}),
+        df_validos['Data'].astype(str),
+        df_validos['Ações'].astype(str),  # Ações (baseado em Ramo Atividade)
+        df_validos['Ofício'].astype(str),  # Ofícios (0 ou 1)
+        df_validos['Resposta Ofício'].astype(str),  # Resposta Ofícios (0 ou 1)
+        tem_protocolo.map({True: '1', False: '0'}),
+        tem_autuacao.map({True: '1', False: '0'}),
+        tem_fotos.map({True: 'SIM', False: 'NÃO'})
+    )
     
-    for _, row in df_validos.iterrows():
-        # RF
-        rf_text = str(row['RF'])[:15] + '...' if len(str(row['RF'])) > 15 else str(row['RF'])
-        pdf.cell(col_widths[0], 8, rf_text, 1, 0, 'C')
-        
-        # RF Principal
-        rf_principal_text = str(row['RF Principal'])[:15] + '...' if len(str(row['RF Principal'])) > 15 else str(row['RF Principal'])
-        pdf.cell(col_widths[1], 8, rf_principal_text, 1, 0, 'C')
-        
-        # Legalização - 1 se tiver RF Principal, 0 se não tiver
-        tem_legalizacao = '1' if row['RF Principal'] and str(row['RF Principal']).strip() != '' else '0'
-        pdf.cell(col_widths[2], 8, tem_legalizacao, 1, 0, 'C')
-        
-        # Data
-        pdf.cell(col_widths[3], 8, str(row['Data']), 1, 0, 'C')
+    # Tabela desenhada pelo fpdf2 (bordas e quebra de página tratadas por linha, cabeçalho repetido)
+    pdf.set_font('Helvetica', '', 7)
+    with pdf.table(
+        col_widths=col_widths,
+        width=sum(col_widths),
+        align='LEFT',
+        text_align='CENTER',
+        line_height=8,
+        headings_style=FontFace(emphasis='BOLD'),
+    ) as table:
+        # Referência local evita a busca do atributo a cada linha
+        adicionar_linha = table.row
         
-        # Ações (agora baseado em Ramo Atividade)
-        pdf.cell(col_widths[4], 8, str(row['Ações']), 1, 0, 'C')
+        # Cabeçalho
+        adicionar_linha(colunas)
         
-        # Ofícios (usa a coluna Ofício que agora é 0 ou 1)
-        pdf.cell(col_widths[5], 8, str(row['Ofício']), 1, 0, 'C')
+        # Dados resumidos
+        for linha in linhas:
+            adicionar_linha(linha)
         
-        # Resposta Ofícios (usa a coluna Resposta Ofício que agora é 0 ou 1)
-        pdf.cell(col_widths[6], 8, str(row['Resposta Ofício']), 1, 0, 'C')
-        
-        # Protocolos: 1 se tiver protocolo, 0 se não tiver
-        tem_protocolo = '1' if row['Protocolo'] and str(row['Protocolo']).strip() != '' else '0'
-        pdf.cell(col_widths[7], 8, tem_protocolo, 1, 0, 'C')
-        
-        # Autuações - 1 se tiver autuação, 0 se não tiver
-        tem_autuacao = '1' if row['Autuação'] and str(row['Autuação']).strip() != '' else '0'
-        pdf.cell(col_widths[8], 8, tem_autuacao, 1, 0, 'C')
-        
-        # Fotos - SIM se tem fotos extraídas, NÃO se não tem
-        tem_fotos = 'SIM' if 'foto(s) extraída(s) da seção 08 - Fotos' in str(row['Fotos']) else 'NÃO'
-        pdf.cell(col_widths[9], 8, tem_fotos, 1, 0, 'C')
-        
-        pdf.ln()
-        
-        # Acumula totais
-        total_acoes += row['Ações'] if pd.notna(row['Ações']) else 0
-        total_oficios += row['Ofício'] if pd.notna(row['Ofício']) else 0
-        total_resposta_oficios += row['Resposta Ofício'] if pd.notna(row['Resposta Ofício']) else 0
-        total_protocolos += 1 if tem_protocolo == '1' else 0
-        total_autuacoes += 1 if tem_autuacao == '1' else 0
-        total_fotos += 1 if tem_fotos == 'SIM' else 0
-    
-    # Linha de totais
-    pdf.set_font('Arial', 'B', 7)
-    pdf.cell(col_widths[0], 8, f"TOTAL ({num_registros})", 1, 0, 'C')
-    pdf.cell(col_widths[1], 8, "", 1, 0, 'C')  # RF Principal
-    pdf.cell(col_widths[2], 8, "", 1, 0, 'C')  # Legalização
-    pdf.cell(col_widths[3], 8, "", 1, 0, 'C')  # Data
-    pdf.cell(col_widths[4], 8, str(total_acoes), 1, 0, 'C')  # Total Ações
-    pdf.cell(col_widths[5], 8, str(total_oficios), 1, 0, 'C')  # Total Ofícios
-    pdf.cell(col_widths[6], 8, str(total_resposta_oficios), 1, 0, 'C')  # Total Resposta Ofícios
-    pdf.cell(col_widths[7], 8, str(total_protocolos), 1, 0, 'C')  # Total Protocolos
-    pdf.cell(col_widths[8], 8, str(total_autuacoes), 1, 0, 'C')  # Total Autuações
-    pdf.cell(col_widths[9], 8, str(total_fotos), 1, 0, 'C')  # Total Fotos
-    pdf.ln()
-    
-    return pdf.output(dest='S').encode('latin1')
+        # Linha de totais
+        adicionar_linha([
+            f"TOTAL ({num_registros})",
+            "",  # RF Principal
+            "",  # Legalização
+            "",  # Data
+            str(total_acoes),  # Total Ações
+            str(total_oficios),  # Total Ofícios
+            str(total_resposta_oficios),  # Total Resposta Ofícios
+            str(total_protocolos),  # Total Protocolos
+            str(total_autuacoes),  # Total Autuações
+            str(total_fotos)  # Total Fotos
+        ], style=FontFace(emphasis='BOLD'))
+    
+    return bytes(pdf.output())
 
 # =================== MÓDULO PRINCIPAL ===================
 def extrator_pdf_consolidado():
@@ -549,47 +684,56 @@ def extrator_pdf_consolidado():
     """)
 
     uploaded_files = st.file_uploader("Selecione os PDFs para extração", type="pdf", accept_multiple_files=True)
+    salvar_fotos = st.checkbox("Salvar fotos extraídas", value=False)
     
     if uploaded_files:
         temp_dir = criar_temp_dir()
         try:
             with st.spinner("Processando arquivos..."):
-                dados_completos = []
+                origens = []
+                nomes = []
+                pastas_fotos = []
+                
+                for idx, file in enumerate(uploaded_files):
+                    if file.size <= LIMITE_PDF_MEMORIA:
+                        # Envia o conteúdo direto ao processo, sem passar pelo disco
+                        origens.append(file.getvalue())
+                    else:
+                        # Prefixo evita colisão entre arquivos enviados com o mesmo nome
+                        temp_path = os.path.join(temp_dir, f"{idx}_{file.name}")
+                        with open(temp_path, "wb") as f:
+                            f.write(file.getbuffer())
+                        origens.append(temp_path)
+                    nomes.append(file.name)
+                    # Pasta das fotos também prefixada, para não misturar arquivos de mesmo nome
+                    pastas_fotos.append(f"{idx}_{os.path.splitext(file.name)[0]}")
                 
-                for file in uploaded_files:
-                    temp_path = os.path.join(temp_dir, file.name)
-                    with open(temp_path, "wb") as f:
-                        f.write(file.getbuffer())
-                    
-                    # Extrai texto del PDF
-                    with pdfplumber.open(temp_path) as pdf:
-                        texto = "\n".join(page.extract_text() or "" for page in pdf.pages)
-                    
-                    # Processa com a função de extração completa (agora passando o caminho del PDF)
-                    dados = extrair_todos_dados(texto, file.name, temp_path, temp_dir)
-                    dados_completos.append(dados)
-                    
-                    os.unlink(temp_path)
+                argumentos = (origens, nomes, repeat(temp_dir), repeat(salvar_fotos), pastas_fotos)
+                max_workers = min(len(origens), os.cpu_count() or 1)
+                if len(origens) < MIN_ARQUIVOS_PARALELO or max_workers < 2:
+                    # Poucos arquivos: processa no próprio processo
+                    dados_completos = list(map(processar_arquivo, *argumentos))
+                else:
+                    # Cada PDF é independente: processa em paralelo (um processo por núcleo)
+                    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                        dados_completos = list(executor.map(processar_arquivo, *argumentos))
                 
-                # Cria DataFrame com todos os dados
-                df_completo = pd.DataFrame(dados_completos).fillna('')
+                # Exibe os erros coletados pelos processos de extração
+                for dados in dados_completos:
+                    for erro in dados.pop('Erros'):
+                        st.error(f"{dados['Nome Arquivo']}: {erro}")
                 
-                # Adiciona linha de totais
-                df_total = pd.DataFrame([{
+                # Adiciona linha de totais antes de montar o DataFrame
+                dados_completos.append({
                     'RF': 'TOTAL',
-                    'Ações': df_completo['Ações'].sum(),
-                    'Ofício': df_completo['Ofício'].sum(),  # Soma dos ofícios (0s e 1s)
-                    'Resposta Ofício': df_completo['Resposta Ofício'].sum()  # Soma das respostas de ofício (0s e 1s)
-                }])
-                df_completo = pd.concat([df_completo, df_total], ignore_index=True)
+                    'Ações': sum(d['Ações'] for d in dados_completos),
+                    'Ofício': sum(d['Ofício'] for d in dados_completos),  # Soma dos ofícios (0s e 1s)
+                    'Resposta Ofício': sum(d['Resposta Ofício'] for d in dados_completos),  # Soma das respostas de ofício (0s e 1s)
+                    'Fotos Extraídas': sum(d['Fotos Extraídas'] for d in dados_completos)  # Mantém a coluna numérica
+                })
                 
-                # Reorganiza as colunas para colocar 'RF Principal' ao lado de 'Data'
-                colunas = list(df_completo.columns)
-                idx_data = colunas.index('Data')
-                # Move 'RF Principal' para depois de 'Data'
-                if 'RF Principal' in colunas:
-                    colunas.insert(idx_data + 1, colunas.pop(colunas.index('RF Principal')))
-                    df_completo = df_completo[colunas]
+                # Cria DataFrame com todos os dados, já na ordem final das colunas
+                df_completo = pd.DataFrame.from_records(dados_completos, columns=COLUNAS_ORDENADAS).fillna('')
                 
                 # Exibe pré-visualização dos dados
                 with st.expander("Visualizar dados extraídos", expanded=True):
@@ -607,6 +751,16 @@ def extrator_pdf_consolidado():
                     pdf_completo,
                     "relatorio_completo.pdf"
                 )
+                
+                # Botão para baixar as fotos (apenas se solicitado)
+                if salvar_fotos:
+                    zip_fotos = compactar_fotos(temp_dir)
+                    if zip_fotos:
+                        st.download_button(
+                            "⬇️ Baixar Fotos Extraídas",
+                            zip_fotos,
+                            "fotos_extraidas.zip"
+                        )
         
         finally:
             limpar_temp_dir(temp_dir)
@@ -634,4 +788,4 @@ def main():
     st.markdown("2025 - Carlos Franklin")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
\ No newline at end of file